@@ -11,19 +11,32 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
+# orjson serializes small response dicts several times faster than
+# stdlib json; fall back to the default JSONResponse if not installed
+try:
+    from fastapi.responses import ORJSONResponse as _ResponseClass
+except ImportError:
+    from fastapi.responses import JSONResponse as _ResponseClass
+
 # from production_rag.fastapi_server import router as rag_router, lifespan as rag_lifespan
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # The PLC poll task is owned here: router-level startup events don't
+    # fire once the app is built with a lifespan
+    from plc.endpoints import start_polling, stop_polling
+    await start_polling()
     # async with rag_lifespan(app):
     #     yield
     yield
+    await stop_polling()
 
 app = FastAPI(
     title="Unified Backend API",
     description="Combined API for MECup application",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=_ResponseClass
 )
 
 # Enable CORS globally
@@ -35,6 +48,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger text/JSON bodies (RAG answers, scan listings); small
+# status replies pass through untouched. Middleware added later sits
+# outermost, so on the response path gzip runs after CORS has attached
+# its headers.
+from fastapi.middleware.gzip import GZipMiddleware
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=4)
+
+
+class _SSEPassthrough:
+    """Keep the token-streaming SSE route out of gzip.
+
+    GZipMiddleware takes its streaming path for any response without a
+    content-length regardless of minimum_size, and zlib buffers the
+    tiny per-token chunks until the stream closes — turning the stream
+    back into a blocking response for gzip-accepting clients. Stripping
+    Accept-Encoding for that route makes gzip pass it through verbatim.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope.get("path", "").endswith("/api/troubleshoot/stream"):
+            scope = dict(scope)
+            scope["headers"] = [
+                (name, value) for name, value in scope["headers"]
+                if name != b"accept-encoding"
+            ]
+        await self.app(scope, receive, send)
+
+# Added after (outside) GZipMiddleware so the header is stripped before
+# gzip inspects the request
+app.add_middleware(_SSEPassthrough)
+
 # Include Routers
 from plc.endpoints import router as plc_router
 app.include_router(plc_router, tags=["PLC"])
@@ -65,6 +111,35 @@ async def root():
 async def health_check():
     return {"status": "ok"}
 
+def _pick_server_impls():
+    """Prefer the C-accelerated event loop and HTTP parser when installed.
+
+    uvloop is Linux/macOS only and httptools is optional, so fall back
+    to the pure-Python implementations rather than hard-requiring them.
+    """
+    loop_impl, http_impl = "asyncio", "h11"
+    try:
+        import uvloop  # noqa: F401
+        loop_impl = "uvloop"
+    except ImportError:
+        pass
+    try:
+        import httptools  # noqa: F401
+        http_impl = "httptools"
+    except ImportError:
+        pass
+    return loop_impl, http_impl
+
 if __name__ == "__main__":
     print("[Backend] Starting MECup Backend on port 5001...", flush=True)
-    uvicorn.run(app, host="0.0.0.0", port=5001, log_level="warning", access_log=False)
+    loop_impl, http_impl = _pick_server_impls()
+    # Workers default to 1: the PLC socket, camera handle, and poll loop
+    # are per-process singletons, and extra workers would each open their
+    # own. BACKEND_WORKERS>1 is opt-in for deployments without them.
+    workers = int(os.environ.get("BACKEND_WORKERS", "1"))
+    if workers > 1:
+        uvicorn.run("main:app", host="0.0.0.0", port=5001, log_level="warning",
+                    access_log=False, loop=loop_impl, http=http_impl, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=5001, log_level="warning",
+                    access_log=False, loop=loop_impl, http=http_impl)
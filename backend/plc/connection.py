@@ -59,6 +59,7 @@ class PLCManager:
             try:
                 print(f"[PLC MANAGER] Connecting to {self.ip}:{self.port}...")
                 self._sock = mc.open_socket(self.ip, self.port)
+                self._tune_socket(self._sock)
                 self.connected = True
                 self.last_error = None
                 self.last_checked = time.time()
@@ -71,6 +72,34 @@ class PLCManager:
                 print(f"[PLC MANAGER] Connection failed: {e}")
                 return False
 
+    def _tune_socket(self, sock):
+        """Best-effort latency tuning of the MC protocol socket.
+
+        On Linux, SO_BUSY_POLL lets the kernel busy-poll the NIC for a few
+        microseconds before sleeping, trimming wakeup latency on the tiny
+        request/reply frames this loop exchanges. All options are applied
+        opportunistically; the constants don't exist on Windows.
+        """
+        try:
+            # Nagle would hold the ~10-byte MC request for up to 40 ms
+            # waiting to coalesce - fatal for a fast poll loop
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            if hasattr(socket, "TCP_QUICKACK"):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+            # Fail fast on a dead PLC instead of hanging the poll thread
+            if hasattr(socket, "TCP_USER_TIMEOUT"):
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, 2000)
+        except OSError:
+            pass
+        try:
+            if hasattr(socket, "SO_BUSY_POLL"):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BUSY_POLL, 50)
+            if hasattr(socket, "SO_PREFER_BUSY_POLL"):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_PREFER_BUSY_POLL, 1)
+        except OSError:
+            pass
+
     def read_bit(self, device, count=1):
         with self._socket_lock:
             if not self.connect():
@@ -95,6 +124,23 @@ class PLCManager:
                 self.disconnect()
                 raise e
 
+    def write_bits_multi(self, writes):
+        """
+        Write several (device, value) bit pairs in one socket transaction.
+        Holds the socket lock across the whole sequence so the frames go
+        out back-to-back on the shared connection with a single connect
+        check, instead of one lock/connect round per bit.
+        """
+        with self._socket_lock:
+            if not self.connect():
+                raise Exception(f"PLC disconnected: {self.last_error}")
+            try:
+                for device, value in writes:
+                    mc.write_bit(self._sock, device, [value])
+            except Exception as e:
+                self.disconnect()
+                raise e
+
     def write_sign_dword(self, device, value_list):
         with self._socket_lock:
             if not self.connect():
@@ -1,7 +1,9 @@
+import asyncio
 import threading
 import time
 import datetime
 import os
+from pathlib import Path
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 from typing import Dict
@@ -32,6 +34,20 @@ except ImportError:
 except Exception:
     pass
 
+# Warm predictor cached at module scope so the capture hot path only
+# does a local lookup instead of going through get_predictor() per shot
+_predictor = None
+_predictor_lock = threading.Lock()
+
+def _get_predictor_cached():
+    """Lazily initialize the shared predictor exactly once."""
+    global _predictor
+    if _predictor is None:
+        with _predictor_lock:
+            if _predictor is None:
+                _predictor = get_predictor()
+    return _predictor
+
 # Store last inference result for frontend polling
 last_inference_result = {
     "filepath": None,
@@ -45,24 +61,53 @@ last_inference_result = {
 recent_events = []
 MAX_EVENTS = 50
 
+# Guards the shared state above: the poller thread writes while HTTP
+# handlers read, so mutations and reads must not interleave (relevant
+# under free-threaded Python where the GIL no longer serializes them).
+_state_lock = threading.Lock()
+
 def add_event(event: str, event_type: str = "info"):
     """Add an event to the recent events list."""
     global recent_events
-    recent_events.insert(0, {
-        "time": datetime.datetime.now().strftime("%H:%M:%S"),
+    entry = {
+        "time": time.strftime("%H:%M:%S"),
         "event": event,
         "type": event_type  # success, warning, error, info
-    })
-    # Keep only last MAX_EVENTS
-    if len(recent_events) > MAX_EVENTS:
-        recent_events = recent_events[:MAX_EVENTS]
+    }
+    with _state_lock:
+        recent_events.insert(0, entry)
+        # Keep only last MAX_EVENTS
+        if len(recent_events) > MAX_EVENTS:
+            recent_events = recent_events[:MAX_EVENTS]
 
 # ------------- Global / Manager -------------
 router = APIRouter()
 manager = PLCManager()
 
-# Batch folder for current scan session
+# Path constants computed once at import instead of per trigger/request
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_CAPTURED_DIR = os.path.join(_BACKEND_DIR, "captured_images")
+os.makedirs(_CAPTURED_DIR, exist_ok=True)
+
+# Batch folder for current scan session (directories are created once when
+# the batch is opened, not on every captured frame)
 current_batch_folder = None
+current_result_dir = None
+# Folder path with trailing separator, so per-capture filenames are a
+# single f-string instead of an os.path.join call
+_batch_prefix = None
+
+def _open_batch_folder(save_dir):
+    """Create the batch folder and its results subfolder exactly once."""
+    global current_batch_folder, current_result_dir, _batch_prefix
+    result_dir = os.path.join(save_dir, "results")
+    prefix = save_dir + os.sep
+    os.makedirs(result_dir, exist_ok=True)
+    with _state_lock:
+        current_batch_folder = save_dir
+        current_result_dir = result_dir
+        _batch_prefix = prefix
+    return save_dir, prefix, result_dir
 
 # ------------- Models -------------
 
@@ -106,106 +151,135 @@ MOTION_COMMANDS = {
 
 # ------------- Polling Logic -------------
 
-def poll_plc_thread():
-    """Background polling using the shared manager."""
-    last_y2 = 0
-    last_y7 = 0
-    last_m101 = 1
-    count = 1
-    county=1
-    start= 0
+POLL_INTERVAL = 0.075
+
+class _PollState:
+    """Edge-detection state carried across poll cycles."""
+    def __init__(self):
+        self.last_y2 = 0
+        self.last_y7 = 0
+        self.last_m101 = 1
+        self.count = 1
+        self.county = 1
+
+def _poll_cycle(st: _PollState):
+    """One blocking poll iteration (runs in a worker thread)."""
+    m5_status = manager.read_bit("M5", 1)
+    if m5_status[0] != 1:
+        return
+    # Check Y2 Trigger
+    resp_y = manager.read_bit("Y2", 6)
+    if not resp_y or len(resp_y) == 0:
+        return
+    current_y2 = resp_y[0]
+    current_y7 = resp_y[5]
+
+    # Rising Edge (0 -> 1)
+    if (current_y2 == 1 and st.last_y2 == 0) or (current_y7 == 1 and st.last_y7 == 0):
+        current_m101 = manager.read_bit("M101", 1)
+        if st.last_m101 != current_m101[0]:
+            st.county += 1
+            st.count = 1
+            st.last_m101 = current_m101[0]
+        # Snapshot the batch trio under the lock so a concurrent
+        # cycle-reset can't null part of it between these reads
+        with _state_lock:
+            save_dir = current_batch_folder
+            batch_prefix = _batch_prefix
+            result_dir = current_result_dir
+        if not save_dir:
+            # Fallback: create new batch folder
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            save_dir, batch_prefix, result_dir = _open_batch_folder(
+                os.path.join(_CAPTURED_DIR, f"scan_{timestamp}")
+            )
+
+        filepath = f"{batch_prefix}grid_{st.county}_{st.count}.jpg"
+
+        if camera_manager:
+            try:
+                if camera_manager.save_current_frame(filepath):
+                    # Run inference on captured image
+                    if get_predictor is not None:
+                        try:
+                            predictor = _get_predictor_cached()
+                            # Results go in the batch's snapshot of the
+                            # 'results' subfolder
+                            mask_path, overlay_path, inference_time, defects = predictor.predict_and_save(
+                                filepath, result_dir, save_overlay=True
+                            )
+
+                            # Update global result for frontend polling
+                            # (build first, then rebind atomically under the lock)
+                            global last_inference_result
+                            new_result = {
+                                "filepath": filepath,
+                                "overlay_path": overlay_path,
+                                "defects": defects,
+                                "inference_time_ms": inference_time,
+                                "timestamp": datetime.datetime.now().isoformat()
+                            }
+                            with _state_lock:
+                                last_inference_result = new_result
+
+                        except Exception:
+                            pass
+
+                    # Feedback M77 - ack immediately; sleeping here
+                    # stalls the whole poll loop between edges
+                    try:
+                        manager.write_bit("M77", [1])
+                        st.count += 1
+                    except Exception:
+                        pass
+            except Exception:
+                pass
+
+    st.last_y2 = current_y2
+    st.last_y7 = current_y7
+
+async def poll_plc_loop():
+    """Background polling task sharing FastAPI's event loop.
+
+    The blocking MC protocol reads run in the default thread executor via
+    asyncio.to_thread, so the event loop stays free to serve requests
+    between cycles and there is no dedicated daemon thread to schedule.
+    """
+    st = _PollState()
     while True:
         try:
-            # Status check (Heartbeat)
-            resp = manager.read_bit("X0", 1)
-            m5_status=manager.read_bit("M5",1)  
-            if m5_status[0]==1:
-                # Check Y2 Trigger
-                resp_y = manager.read_bit("Y2", 6)
-                if resp_y and len(resp_y) > 0:
-                    current_y2 = resp_y[0]
-                    current_y7 = resp_y[5]
-                    
-                    # Rising Edge (0 -> 1)
-                    if (current_y2 == 1 and last_y2 == 0) or (current_y7 == 1 and last_y7 == 0):
-                        current_m101= manager.read_bit("M101",1)
-                        if last_m101!=current_m101[0]:
-                            county+=1
-                            count=1
-                            last_m101=current_m101[0]
-                        global current_batch_folder
-                        backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                        
-                        # Use batch folder if set, otherwise create one
-                        if current_batch_folder:
-                            save_dir = current_batch_folder
-                        else:
-                            # Fallback: create new batch folder
-                            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                            save_dir = os.path.join(backend_dir, "captured_images", f"scan_{timestamp}")
-                            current_batch_folder = save_dir
-                        
-                        os.makedirs(save_dir, exist_ok=True)
-                        filepath = os.path.join(save_dir, f"grid_{county}_{count}.jpg")
-                        
-                        if camera_manager:
-                            try:
-                                if camera_manager.save_current_frame(filepath):
-                                    # Run inference on captured image
-                                    if get_predictor is not None:
-                                        try:
-                                            predictor = get_predictor()
-                                            # Store results in 'results' subfolder of current batch
-                                            result_dir = os.path.join(save_dir, "results")
-                                            os.makedirs(result_dir, exist_ok=True)
-                                            mask_path, overlay_path, inference_time, defects = predictor.predict_and_save(
-                                                filepath, result_dir, save_overlay=True
-                                            )
-                                            
-                                            # Update global result for frontend polling
-                                            global last_inference_result
-                                            last_inference_result = {
-                                                "filepath": filepath,
-                                                "overlay_path": overlay_path,
-                                                "defects": defects,
-                                                "inference_time_ms": inference_time,
-                                                "timestamp": datetime.datetime.now().isoformat()
-                                            }
-                                            
-                                        except Exception:
-                                            pass
-                                    
-                                    # Feedback M77
-                                    try:
-                                        time.sleep(2)
-                                        manager.write_bit("M77", [1])
-                                        count += 1
-                                    except Exception:
-                                        pass
-                            except Exception:
-                                pass
-                    
-                    last_y2 = current_y2
-                    last_y7 = current_y7
-                
-                
+            await asyncio.to_thread(_poll_cycle, st)
         except Exception:
             # Logging suppressed for cleanliness
-            time.sleep(1)
-            
-        time.sleep(0.075)
+            await asyncio.sleep(1)
+        await asyncio.sleep(POLL_INTERVAL)
 
 # ------------- Startup Logic -------------
 
-def start_polling():
-    t = threading.Thread(target=poll_plc_thread, daemon=True)
-    t.start()
+_poll_task = None
+
+async def start_polling():
+    """Start the poll task; called from the app lifespan in main.py.
+
+    Router-level on_event("startup") never fires when the app is
+    constructed with a lifespan (as main.py does on fastapi 0.109), so
+    the task is owned by the app lifespan instead.
+    """
+    global _poll_task
+    if manager.ip and manager.port and _poll_task is None:
+        _poll_task = asyncio.create_task(poll_plc_loop())
+
+async def stop_polling():
+    """Cancel the poll task on app shutdown."""
+    global _poll_task
+    if _poll_task is not None:
+        _poll_task.cancel()
+        _poll_task = None
 
-# Load settings on import and start polling if configured
+# Load settings on import; the poll task starts with the app
 settings = load_plc_settings()
 if settings and settings.get("ip") and settings.get("port"):
     manager.configure(settings["ip"], settings["port"])
-    start_polling()
 
 
 # ------------- General PLC Endpoints -------------
@@ -239,16 +313,19 @@ async def plc_connect(req: PLCConnectRequest):
 @router.get("/events")
 async def get_events():
     """Get recent system events."""
-    return {"events": recent_events[:20]}
+    with _state_lock:
+        return {"events": recent_events[:20]}
 
 @router.post("/plc/write")
 async def plc_write(req: PLCWriteRequest):
     """Generic write endpoint."""
-    if not manager.connected:
-        return {"success": False, "error": "PLC Not Connected"}
+    # Writes reuse the manager's long-lived socket; if the link dropped,
+    # try one reconnect instead of failing every call until /plc/connect
+    if not manager.connected and not await asyncio.to_thread(manager.connect):
+        return {"success": False, "error": manager.last_error or "PLC Not Connected"}
     try:
         val_list = [1] if req.value == 1 else [0]
-        manager.write_bit(req.device, val_list)
+        await asyncio.to_thread(manager.write_bit, req.device, val_list)
         return {"success": True}
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -258,24 +335,23 @@ async def plc_write(req: PLCWriteRequest):
 @router.post("/plc/scan-start")
 async def scan_start():
     """Start scan by setting M5 to ON and creating a new batch folder."""
-    global current_batch_folder
     if not manager.connected:
         return {"success": False, "error": "PLC Not Connected"}
     try:
         # Create new batch folder with timestamp if not already set
-        if not current_batch_folder:
-            backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            current_batch_folder = os.path.join(backend_dir, "captured_images", f"scan_{timestamp}")
-            os.makedirs(current_batch_folder, exist_ok=True)
-        
-        manager.write_bit("M5", [1])
-        time.sleep(1)
-        manager.write_bit("M77", [1])
-        time.sleep(0.1)
-        manager.write_bit("M77", [0])
+        with _state_lock:
+            batch_folder = current_batch_folder
+        if not batch_folder:
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            batch_folder, _, _ = _open_batch_folder(
+                os.path.join(_CAPTURED_DIR, f"scan_{timestamp}")
+            )
+
+        await asyncio.to_thread(manager.write_bits_multi, [("M5", 1), ("M77", 1)])
+        await asyncio.sleep(0.1)
+        await asyncio.to_thread(manager.write_bit, "M77", [0])
         add_event("Scan started", "success")
-        return {"success": True, "message": "Scan Started (M5 ON)", "batch_folder": current_batch_folder}
+        return {"success": True, "message": "Scan Started (M5 ON)", "batch_folder": batch_folder}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -293,13 +369,17 @@ async def grid_one():
 @router.post("/plc/cycle-reset")
 async def cycle_reset():
     """Reset cycle by setting M120 to ON and clearing batch folder."""
-    global current_batch_folder
+    global current_batch_folder, current_result_dir, _batch_prefix
     if not manager.connected:
         return {"success": False, "error": "PLC Not Connected"}
     try:
-        manager.write_bit("M120", [1])
-        # Clear batch folder so new scan creates a new folder
-        current_batch_folder = None
+        await asyncio.to_thread(manager.write_bit, "M120", [1])
+        # Clear the batch trio atomically so the poller never sees a
+        # half-reset state (e.g. a live prefix with a nulled folder)
+        with _state_lock:
+            current_batch_folder = None
+            current_result_dir = None
+            _batch_prefix = None
         add_event("Cycle reset completed", "info")
         return {"success": True, "message": "Cycle Reset (M120 ON) - Batch cleared"}
     except Exception as e:
@@ -363,23 +443,25 @@ async def get_heartbeat():
 @router.get("/plc/latest-inference")
 async def get_latest_inference():
     """Get the latest automatic inference result from PLC-triggered capture."""
-    if last_inference_result["timestamp"] is None:
+    # Snapshot the reference so the poller can't swap it mid-read
+    with _state_lock:
+        result = last_inference_result
+    if result["timestamp"] is None:
         return {"has_result": False}
-    
+
     # Generate URL for overlay
     overlay_url = None
-    if last_inference_result["overlay_path"]:
-        from pathlib import Path
-        overlay_filename = Path(last_inference_result["overlay_path"]).name
+    if result["overlay_path"]:
+        overlay_filename = Path(result["overlay_path"]).name
         overlay_url = f"/inference/result/{overlay_filename}"
-    
+
     return {
         "has_result": True,
-        "filepath": last_inference_result["filepath"],
+        "filepath": result["filepath"],
         "overlay_url": overlay_url,
-        "defects": last_inference_result["defects"],
-        "inference_time_ms": last_inference_result["inference_time_ms"],
-        "timestamp": last_inference_result["timestamp"]
+        "defects": result["defects"],
+        "inference_time_ms": result["inference_time_ms"],
+        "timestamp": result["timestamp"]
     }
 
 # ------------- Servo Endpoints (Merged) -------------
@@ -389,9 +471,11 @@ async def set_servo_speeds(speeds: ServoSpeedRequest) -> Dict[str, str]:
     if not manager.connected:
         raise HTTPException(status_code=503, detail="PLC Not Connected")
     try:
-        manager.write_sign_dword("D2", [speeds.x])
-        manager.write_sign_dword("D0", [speeds.y])
-        manager.write_sign_dword("D4", [speeds.z])
+        # D0/D2/D4 are consecutive dwords (D0-D1, D2-D3, D4-D5), so one
+        # multi-value write covers all three axes in a single round trip
+        await asyncio.to_thread(
+            manager.write_sign_dword, "D0", [speeds.y, speeds.x, speeds.z]
+        )
         print(f"[SERVO] Speeds set: {speeds}")
         return {"status": "success", "message": "Speeds updated"}
     except Exception as e:
@@ -403,9 +487,9 @@ async def get_servo_speeds():
     if not manager.connected:
         return {"connected": False, "x": 0, "y": 0, "z": 0}
     try:
-        y_speed = manager.read_sign_dword("D0", 1)
-        x_speed = manager.read_sign_dword("D2", 1)
-        z_speed = manager.read_sign_dword("D4", 1)
+        y_speed = await asyncio.to_thread(manager.read_sign_dword, "D0", 1)
+        x_speed = await asyncio.to_thread(manager.read_sign_dword, "D2", 1)
+        z_speed = await asyncio.to_thread(manager.read_sign_dword, "D4", 1)
         return {
             "connected": True,
             "x": x_speed[0] if x_speed else 0,
@@ -421,7 +505,7 @@ async def enable_servo(req: ServoEnableRequest) -> Dict[str, str]:
         raise HTTPException(status_code=503, detail="PLC Not Connected")
     try:
         val = [1] if req.enable else [0]
-        manager.write_bit("M0", val)
+        await asyncio.to_thread(manager.write_bit, "M0", val)
         return {"status": "success", "message": f"Servo {'Enabled' if req.enable else 'Disabled'}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -435,10 +519,12 @@ async def trigger_motion(req: ServoMoveRequest) -> Dict[str, str]:
     
     bit_addr = MOTION_COMMANDS[req.command]
     try:
-        manager.write_bit(bit_addr, [1])
+        # write_bit blocks on PLC socket I/O and the pulse holds for 4s;
+        # keep both off the event loop so other endpoints stay responsive
+        await asyncio.to_thread(manager.write_bit, bit_addr, [1])
         print(f"[SERVO] Triggered {req.command}")
-        time.sleep(4)
-        manager.write_bit(bit_addr, [0])
+        await asyncio.sleep(4)
+        await asyncio.to_thread(manager.write_bit, bit_addr, [0])
         return {"status": "success", "message": f"Triggered {req.command}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -448,8 +534,7 @@ async def trigger_motion(req: ServoMoveRequest) -> Dict[str, str]:
 @router.get("/scans/list")
 async def list_scans():
     """List all past scan folders from captured_images directory."""
-    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    captured_dir = os.path.join(backend_dir, "captured_images")
+    captured_dir = _CAPTURED_DIR
     
     if not os.path.exists(captured_dir):
         return {"scans": []}
@@ -506,35 +591,22 @@ async def list_scans():
     scans.sort(key=lambda x: x["id"], reverse=True)
     return {"scans": scans}
 
-@router.get("/scans/{scan_id}")
-async def get_scan_details(scan_id: str):
-    """Get detailed information about a specific scan."""
-    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    folder_path = os.path.join(backend_dir, "captured_images", scan_id)
-    
-    if not os.path.exists(folder_path):
-        raise HTTPException(status_code=404, detail="Scan not found")
-    
-    # Parse timestamp
-    try:
-        timestamp_str = scan_id.replace("scan_", "")
-        dt = datetime.datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
-        date_str = dt.strftime("%Y-%m-%d")
-        time_str = dt.strftime("%H:%M:%S")
-    except:
-        date_str = "Unknown"
-        time_str = "Unknown"
-    
+# Parsed scan details keyed by scan_id, invalidated when the scan folder
+# or its results subfolder changes on disk
+_details_cache = {}
+
+def _load_scan_details(scan_id, folder_path):
+    """Parse images and defect metadata for a scan folder (uncached)."""
     # Get all images
     images = [f for f in os.listdir(folder_path) if f.endswith(".jpg")]
     images.sort()
-    
+
     # Get results and count defects by type
     results_dir = os.path.join(folder_path, "results")
     defects = []
     defect_types = {}
     total_defect_count = 0
-    
+
     if os.path.exists(results_dir):
         import json
         for f in os.listdir(results_dir):
@@ -544,13 +616,13 @@ async def get_scan_details(scan_id: str):
                         meta = json.load(jf)
                         base_name = f.replace("_meta.json", "")
                         overlay_file = f"{base_name}_overlay.png"
-                        
+
                         # Add each defect type from this image
                         for defect in meta.get("defects", []):
                             defect_type = defect.get("type", "Unknown")
                             defect_types[defect_type] = defect_types.get(defect_type, 0) + 1
                             total_defect_count += 1
-                        
+
                         # Add to defects list if has any defects
                         if meta.get("defect_count", 0) > 0:
                             defects.append({
@@ -562,7 +634,7 @@ async def get_scan_details(scan_id: str):
                             })
                 except:
                     pass
-        
+
         # Fallback for old scans without JSON
         if total_defect_count == 0:
             for f in os.listdir(results_dir):
@@ -576,46 +648,98 @@ async def get_scan_details(scan_id: str):
                         "defect_details": []
                     })
                     total_defect_count += 1
-    
+
+    return images, defects, defect_types, total_defect_count
+
+@router.get("/scans/{scan_id}")
+async def get_scan_details(scan_id: str, offset: int = 0, limit: int = 100):
+    """Get detailed information about a specific scan (paginated)."""
+    folder_path = os.path.join(_CAPTURED_DIR, scan_id)
+
+    try:
+        folder_mtime = os.stat(folder_path).st_mtime_ns
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Scan not found")
+
+    # Parse timestamp
+    try:
+        timestamp_str = scan_id.replace("scan_", "")
+        dt = datetime.datetime.strptime(timestamp_str, "%Y%m%d_%H%M%S")
+        date_str = dt.strftime("%Y-%m-%d")
+        time_str = dt.strftime("%H:%M:%S")
+    except:
+        date_str = "Unknown"
+        time_str = "Unknown"
+
+    # Results land in a subfolder, so its mtime has to key the cache too
+    try:
+        results_mtime = os.stat(os.path.join(folder_path, "results")).st_mtime_ns
+    except FileNotFoundError:
+        results_mtime = 0
+
+    cache_key = (folder_mtime, results_mtime)
+    cached = _details_cache.get(scan_id)
+    if cached and cached[0] == cache_key:
+        images, defects, defect_types, total_defect_count = cached[1]
+    else:
+        parsed = _load_scan_details(scan_id, folder_path)
+        _details_cache[scan_id] = (cache_key, parsed)
+        images, defects, defect_types, total_defect_count = parsed
+
     # Fail if defects > images/10
     image_count = len(images)
     threshold = image_count / 10
-    
+
     return {
         "id": scan_id,
         "date": date_str,
         "time": time_str,
         "folder_path": folder_path,
         "image_count": image_count,
-        "images": images,
+        "total_images": image_count,
+        "images": images[offset:offset + limit],
         "total_defects": total_defect_count,
         "defect_types": defect_types,
-        "defects": defects,
+        "defects": defects[offset:offset + limit],
         "status": "fail" if total_defect_count > threshold else "pass"
     }
 
+from email.utils import parsedate_to_datetime
+from fastapi import Request, Response
 from fastapi.responses import FileResponse
 
+def _serve_scan_file(request: Request, file_path: str, media_type: str, detail: str):
+    """Serve a scan image with a single stat call and conditional GET.
+
+    Scan images are immutable once written, so If-Modified-Since hits
+    return 304 without re-sending the file. The stat result is reused by
+    FileResponse instead of statting the path a second time.
+    """
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=detail)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            if int(st.st_mtime) <= int(parsedate_to_datetime(if_modified_since).timestamp()):
+                return Response(status_code=304)
+        except (TypeError, ValueError):
+            pass
+
+    return FileResponse(file_path, media_type=media_type, stat_result=st)
+
 @router.get("/scans/{scan_id}/image/{filename}")
-async def get_scan_image(scan_id: str, filename: str):
+async def get_scan_image(request: Request, scan_id: str, filename: str):
     """Get a specific image from a scan."""
-    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    file_path = os.path.join(backend_dir, "captured_images", scan_id, filename)
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Image not found")
-    
-    return FileResponse(file_path, media_type="image/jpeg")
+    file_path = os.path.join(_CAPTURED_DIR, scan_id, filename)
+    return _serve_scan_file(request, file_path, "image/jpeg", "Image not found")
 
 @router.get("/scans/{scan_id}/results/{filename}")
-async def get_scan_result(scan_id: str, filename: str):
+async def get_scan_result(request: Request, scan_id: str, filename: str):
     """Get a result image from a scan."""
-    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    file_path = os.path.join(backend_dir, "captured_images", scan_id, "results", filename)
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Result image not found")
-    
+    file_path = os.path.join(_CAPTURED_DIR, scan_id, "results", filename)
     media_type = "image/png" if filename.endswith(".png") else "image/jpeg"
-    return FileResponse(file_path, media_type=media_type)
+    return _serve_scan_file(request, file_path, media_type, "Result image not found")
 
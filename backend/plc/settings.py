@@ -1,29 +1,50 @@
 import json
 import os
+import threading
 
 SETTINGS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'settings.json')
 
-def save_plc_settings(ip, port):
-    settings = {}
+# Settings cached in memory so request handlers never touch the disk;
+# the file is only read once and rewritten in a background thread.
+_cache = None
+_cache_lock = threading.Lock()
+
+def _read_settings_file():
     if os.path.exists(SETTINGS_FILE):
         with open(SETTINGS_FILE, 'r') as f:
             try:
-                settings = json.load(f)
+                return json.load(f)
             except json.JSONDecodeError:
                 pass
-    
-    settings['plc_ip'] = ip
-    settings['plc_port'] = port
+    return {}
 
-    with open(SETTINGS_FILE, 'w') as f:
-        json.dump(settings, f, indent=4)
+def _flush(settings):
+    """Write settings atomically: dump to a tempfile, then os.replace."""
+    tmp_path = SETTINGS_FILE + '.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(settings, indent=4))
+        os.replace(tmp_path, SETTINGS_FILE)
+    except OSError:
+        pass
+
+def save_plc_settings(ip, port):
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = _read_settings_file()
+        _cache['plc_ip'] = ip
+        _cache['plc_port'] = port
+        snapshot = dict(_cache)
+    threading.Thread(target=_flush, args=(snapshot,), daemon=True).start()
 
 def load_plc_settings():
-    if os.path.exists(SETTINGS_FILE):
-        with open(SETTINGS_FILE, 'r') as f:
-            try:
-                data = json.load(f)
-                return {'ip': data.get('plc_ip'), 'port': data.get('plc_port')}
-            except json.JSONDecodeError:
-                return None
-    return None
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = _read_settings_file()
+        ip = _cache.get('plc_ip')
+        port = _cache.get('plc_port')
+    if ip is None and port is None:
+        return None
+    return {'ip': ip, 'port': port}
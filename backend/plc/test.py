@@ -1,16 +1,58 @@
-try:
+"""Quick PLC write test / benchmark client.
+
+Default: one write through the backend API (falls back to a direct MC
+protocol write if the backend is not running).
+
+    python test.py --bench 100   # loop N times and print p50/p95/p99
+"""
+
+import sys
+import time
+
+URL = "http://localhost:5001/plc/write"
+PAYLOAD = {"device": "M77", "value": 1}
+
+
+def _percentiles(samples_ms):
+    samples_ms = sorted(samples_ms)
+    n = len(samples_ms)
+    for label, q in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99)):
+        print(f"  {label}: {samples_ms[min(n - 1, int(q * n))]:.2f} ms")
+
+
+def run_api(iterations):
     import requests
-    import sys
-
-    url = "http://localhost:5001/plc/write"
-    payload = {
-        "device": "M77",
-        "value": 1
-    }
-    response = requests.post(url, json=payload)
+    # One Session so every request reuses the same TCP connection
+    session = requests.Session()
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        response = session.post(URL, json=PAYLOAD)
+        latencies.append((time.perf_counter_ns() - start) / 1e6)
     print(response.json())
-except:
+    if iterations > 1:
+        _percentiles(latencies)
+
+
+def run_direct(iterations):
     import rk_mcprotocol as mc
-    sock= mc.open_socket('192.168.1.30',5000)
-    mc.write_bit(sock,'Y1',[1])
-    print(mc.read_bit(sock,'Y1',1))
\ No newline at end of file
+    # Keep the socket open across iterations instead of one per write
+    sock = mc.open_socket('192.168.1.30', 5000)
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        mc.write_bit(sock, 'Y1', [1])
+        latencies.append((time.perf_counter_ns() - start) / 1e6)
+    print(mc.read_bit(sock, 'Y1', 1))
+    if iterations > 1:
+        _percentiles(latencies)
+
+
+if __name__ == "__main__":
+    n = 1
+    if "--bench" in sys.argv:
+        n = int(sys.argv[sys.argv.index("--bench") + 1])
+    try:
+        run_api(n)
+    except Exception:
+        run_direct(n)
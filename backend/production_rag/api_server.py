@@ -1,57 +1,36 @@
 """
-Flask API Server for Production RAG Agent
-Provides REST API endpoint for troubleshooting queries
+Standalone API Server for Production RAG Agent
+
+Thin uvicorn entrypoint around the FastAPI router in fastapi_server.
+Replaces the old Flask server, which duplicated the endpoints and
+loaded a second copy of the models when both servers ran; the Flask
+before_request init was also racy under concurrent first requests.
+Same port and routes as before.
 """
 
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import sys
-import os
-
-sys.path.append('./production_rag')
-
-from agent import get_agent
-
-app = Flask(__name__)
-CORS(app)
-
-agent = None
-
-@app.before_request
-def initialize_agent():
-    global agent
-    if agent is None:
-        print("Initializing RAG agent...")
-        agent = get_agent()
-        print("Agent ready!")
-
-@app.route('/api/troubleshoot', methods=['POST'])
-def troubleshoot():
-    try:
-        data = request.get_json()
-        query = data.get('query', '')
-        
-        if not query:
-            return jsonify({'error': 'Query is required'}), 400
-        
-        print(f"\n[Query] {query}")
-        response = agent.query(query)
-        print(f"[Response] {response[:100]}...")
-        
-        return jsonify({'response': response})
-    
-    except Exception as e:
-        print(f"[Error] {str(e)}")
-        return jsonify({'error': str(e)}), 500
-
-@app.route('/api/health', methods=['GET'])
-def health():
-    return jsonify({
-        'status': 'healthy',
-        'agent_loaded': agent is not None
-    })
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+try:
+    from .fastapi_server import router, lifespan
+except ImportError:
+    from fastapi_server import router, lifespan
+
+app = FastAPI(title="Troubleshooting Agent API", lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+app.include_router(router)
 
 if __name__ == '__main__':
+    import uvicorn
+
     print("="*60)
     print("Starting Troubleshooting Agent API Server")
     print("="*60)
@@ -59,5 +38,5 @@ if __name__ == '__main__':
     print("API endpoint: POST /api/troubleshoot")
     print("Health check: GET /api/health")
     print("="*60 + "\n")
-    
-    app.run(host='0.0.0.0', port=5001, debug=False)
+
+    uvicorn.run(app, host='0.0.0.0', port=5001)
@@ -0,0 +1,198 @@
+"""
+Embedding backends for the Production RAG agent.
+
+Default is the HuggingFace (PyTorch) bge-base encoder. Setting
+RAG_EMBED_BACKEND=onnx switches to an int8-quantized ONNX Runtime
+export of the same model, which roughly halves-to-thirds per-query
+embed latency on VNNI-capable CPUs. The quantized model is exported
+once and cached on disk next to this module.
+"""
+
+import os
+from functools import lru_cache
+
+# OMP/MKL read these once at library init, which the langchain import
+# below triggers via torch — so they must be set first. setdefault so
+# an operator's explicit tuning wins. Note these cores are shared with
+# Ollama: if OLLAMA_NUM_PARALLEL > 1 is in play, cap BGE_NUM_THREADS
+# below so embedding and generation don't thrash each other.
+_N_CORES = str(os.cpu_count() or 1)
+os.environ.setdefault("OMP_NUM_THREADS", _N_CORES)
+os.environ.setdefault("MKL_NUM_THREADS", _N_CORES)
+
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+EMBEDDING_MODEL = "BAAI/bge-base-en-v1.5"
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ONNX_CACHE_DIR = os.path.join(SCRIPT_DIR, "onnx_int8")
+
+
+class ORTQuantizedEmbeddings(Embeddings):
+    """bge-base exported to ONNX and dynamically quantized to int8.
+
+    Implements the LangChain Embeddings interface so it drops into the
+    existing Chroma call sites unchanged. Requires optimum[onnxruntime].
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, cache_dir: str = ONNX_CACHE_DIR):
+        import torch
+        import onnxruntime
+        from transformers import AutoTokenizer
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        self._torch = torch
+
+        quant_path = os.path.join(cache_dir, "model_quantized.onnx")
+        if not os.path.exists(quant_path):
+            print(f"[*] Exporting {model_name} to int8 ONNX (one-time)...")
+            model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+            quantizer = ORTQuantizer.from_pretrained(model)
+            qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=cache_dir, quantization_config=qconfig)
+
+        # Let the int8 matmuls use every core; inference here is a
+        # single session, so intra-op parallelism is the only axis
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = os.cpu_count() or 1
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            cache_dir,
+            file_name="model_quantized.onnx",
+            provider="CPUExecutionProvider",
+            session_options=session_options
+        )
+
+    def _encode(self, texts):
+        torch = self._torch
+        inputs = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=512, return_tensors="pt"
+        )
+        with torch.inference_mode():
+            outputs = self.model(**inputs)
+        # bge models use CLS-token pooling, then L2 normalization
+        pooled = outputs.last_hidden_state[:, 0]
+        pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+        return pooled.tolist()
+
+    def embed_documents(self, texts):
+        return self._encode(list(texts))
+
+    def embed_query(self, text):
+        return self._encode([text])[0]
+
+
+class CT2Embeddings(Embeddings):
+    """bge-base run through CTranslate2's fused int8 GEMM kernels.
+
+    CT2 skips PyTorch's per-call dispatch and autograd bookkeeping
+    entirely. Requires ctranslate2 + hf-hub-ctranslate2; the model is
+    converted and cached on first load.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, device: str = 'cpu'):
+        from hf_hub_ctranslate2 import CT2SentenceTransformer
+
+        compute_type = "int8_float16" if device == "cuda" else "int8"
+        self.model = CT2SentenceTransformer(
+            model_name, compute_type=compute_type, device=device
+        )
+
+    def embed_documents(self, texts):
+        embeddings = self.model.encode(
+            list(texts), normalize_embeddings=True, convert_to_numpy=True
+        )
+        return embeddings.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _tune_torch_threads():
+    """Pin torch to intra-op parallelism only for BGE matmuls.
+
+    The default heuristic under- or over-subscribes in containers;
+    inter-op stays at 1 because encode batches here are tiny.
+    """
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(int(os.environ.get("BGE_NUM_THREADS", os.cpu_count() or 1)))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Only settable before torch runs its first parallel op
+        pass
+
+
+def build_embeddings(backend: str = None, batch_size: int = 1, device: str = 'cpu'):
+    """Build the embedding model for the configured backend."""
+    backend = backend or os.environ.get("RAG_EMBED_BACKEND", "hf")
+    _tune_torch_threads()
+
+    if backend == "onnx" and device == 'cpu':
+        try:
+            return ORTQuantizedEmbeddings()
+        except ImportError as e:
+            print(f"[WARN] ONNX embedding backend unavailable ({e}), falling back to HF")
+
+    if backend == "ct2":
+        try:
+            return CT2Embeddings(device=device)
+        except ImportError as e:
+            print(f"[WARN] CTranslate2 embedding backend unavailable ({e}), falling back to HF")
+
+    if backend == "openvino" and device == 'cpu':
+        # sentence-transformers' OpenVINO backend; point RAG_OV_FILE_NAME
+        # at an int8-quantized openvino_model_qint8_quantized.xml export
+        # to also get VNNI int8 kernels
+        try:
+            model_kwargs = {'device': 'cpu', 'backend': 'openvino'}
+            ov_file = os.environ.get("RAG_OV_FILE_NAME")
+            if ov_file:
+                model_kwargs['model_kwargs'] = {'file_name': ov_file}
+            return HuggingFaceEmbeddings(
+                model_name=EMBEDDING_MODEL,
+                model_kwargs=model_kwargs,
+                encode_kwargs={'normalize_embeddings': True, 'batch_size': batch_size}
+            )
+        except Exception as e:
+            print(f"[WARN] OpenVINO embedding backend unavailable ({e}), falling back to HF")
+
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={'device': device},
+        encode_kwargs={'normalize_embeddings': True, 'batch_size': batch_size}
+    )
+
+
+@lru_cache(maxsize=1)
+def _load_embeddings(device: str):
+    """Load and warm the shared model; cached per process."""
+    embeddings = build_embeddings(device=device)
+    try:
+        embeddings.embed_query("warmup")
+    except Exception as e:
+        print(f"[WARN] Embedding warm-up failed: {e}")
+    return embeddings
+
+
+def get_embeddings(device: str = 'cpu', batch_size: int = 1):
+    """Process-wide shared embedding model.
+
+    BGE-base weighs ~440MB in RAM; the agent and the rebuild path used
+    to load independent copies when imported in the same process. The
+    cache is keyed on device only — batch_size is applied to the shared
+    instance per call, otherwise the agent (batch 1) and the rebuild
+    path (batch 32) would each load and evict their own copy. First-call
+    tokenizer/kernel warmup is paid at load rather than on the first
+    real query.
+    """
+    embeddings = _load_embeddings(device)
+    encode_kwargs = getattr(embeddings, "encode_kwargs", None)
+    if isinstance(encode_kwargs, dict):
+        encode_kwargs["batch_size"] = batch_size
+    return embeddings
@@ -5,21 +5,158 @@ Provides REST API endpoint for troubleshooting queries
 
 import sys
 import os
+import shutil
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 
+import numpy as np
+
+# Per-request tracing goes through a level-gated logger instead of
+# print(): disabled records cost one attribute compare, while print
+# always formats and flushes stdout under the GIL. RAG_LOG=INFO turns
+# the traces on.
+log = logging.getLogger("rag")
+log.setLevel(getattr(logging, os.environ.get("RAG_LOG", "WARNING").upper(), logging.WARNING))
+# Nothing else configures logging in this process (uvicorn only sets up
+# its own loggers), so attach a handler or records below WARNING would
+# die in logging's lastResort handler and RAG_LOG=INFO would do nothing
+if not log.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_handler)
+
 # Add script directory to path if run directly (though now it's a module)
 # sys.path.append('./production_rag') 
 
 from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, constr
 
-from .agent import get_agent
+try:
+    from .agent import get_agent, VECTORDB_DIR
+except ImportError:
+    from agent import get_agent, VECTORDB_DIR
 
 # Global agent instance
 agent = None
 
+# Bound simultaneous LLM generations to what Ollama can actually
+# pipeline (OLLAMA_NUM_PARALLEL); excess requests queue here instead of
+# thrashing the model server. Cache hits and health checks bypass it.
+GEN_SEM = asyncio.Semaphore(int(os.environ.get("RAG_CONCURRENCY", "2")))
+
+# Semantic response cache: the same ~50 machine issues recur with small
+# wording variations, so near-duplicate queries can reuse a previous
+# response without an LLM call. Exact match on the normalized text is
+# checked first, then cosine similarity of the query embedding against
+# the cached embeddings (rows are L2-normalized, so one matvec).
+_SEM_THRESHOLD = 0.92
+# Embeddings live in one preallocated contiguous matrix (structure of
+# arrays) so the similarity scan is a single BLAS matvec over rows that
+# stream linearly through cache, with metadata in parallel structures.
+# Capacity grows geometrically; inserts are an O(d) row write.
+_SEM_INITIAL_CAP = 64
+_sem_lock = asyncio.Lock()
+_sem_index = {}          # normalized text -> response index
+_sem_responses = []
+_sem_embs = None         # (cap, d) float16, rows < _sem_count valid
+_sem_count = 0
+
+
+def _sem_append_row(vec):
+    """Append one L2-normalized embedding row, growing capacity 2x as needed."""
+    global _sem_embs, _sem_count
+    # float16 halves the bytes streamed per scan — the actual bottleneck
+    # for a memory-bound matvec — at ~99% similarity fidelity
+    if _sem_embs is None:
+        _sem_embs = np.empty((_SEM_INITIAL_CAP, vec.shape[0]), dtype=np.float16)
+    elif _sem_count == len(_sem_embs):
+        grown = np.empty((len(_sem_embs) * 2, _sem_embs.shape[1]), dtype=np.float16)
+        grown[:_sem_count] = _sem_embs[:_sem_count]
+        _sem_embs = grown
+    _sem_embs[_sem_count] = vec
+    _sem_count += 1
+
+
+# Micro-batching for query embeddings: concurrent requests coalesce
+# into one embed_documents call instead of N single-row GEMMs. A lone
+# request waits at most _EMBED_MAX_WAIT before being encoded alone.
+_EMBED_BATCH_MAX = 16
+_EMBED_MAX_WAIT = 0.008
+_embed_queue = None
+_embed_task = None
+
+
+async def _embed_batcher():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _embed_queue.get()]
+        deadline = loop.time() + _EMBED_MAX_WAIT
+        while len(batch) < _EMBED_BATCH_MAX:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_embed_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        texts = [text for text, _ in batch]
+        try:
+            vecs = await asyncio.to_thread(agent.embeddings.embed_documents, texts)
+            for (_, fut), vec in zip(batch, vecs):
+                if not fut.done():
+                    fut.set_result(vec)
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+
+
+async def _embed_one(text: str):
+    """Embed one query via the micro-batcher (or directly before startup)."""
+    if _embed_queue is None:
+        return await asyncio.to_thread(agent.embeddings.embed_query, text)
+    fut = asyncio.get_running_loop().create_future()
+    await _embed_queue.put((text, fut))
+    return await fut
+
+
+async def _sem_lookup(normalized: str):
+    """Return (cached response or None, normalized query embedding)."""
+    async with _sem_lock:
+        idx = _sem_index.get(normalized)
+        if idx is not None:
+            return _sem_responses[idx], None
+
+    vec = np.asarray(await _embed_one(normalized), dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    if norm > 0:
+        vec /= norm
+
+    async with _sem_lock:
+        if _sem_count:
+            # Rows are normalized on insert, so cosine is a pure matvec;
+            # cast-on-compute keeps the accumulation in float32
+            sims = _sem_embs[:_sem_count].astype(np.float32, copy=False) @ vec
+            best = int(sims.argmax())
+            if sims[best] >= _SEM_THRESHOLD:
+                return _sem_responses[best], vec
+    return None, vec
+
+
+async def _sem_store(normalized: str, vec, response: str):
+    async with _sem_lock:
+        if normalized in _sem_index:
+            return
+        _sem_index[normalized] = len(_sem_responses)
+        _sem_responses.append(response)
+        _sem_append_row(vec)
+
 class QueryRequest(BaseModel):
-    query: str
+    # Validated at the framework level (422 before the handler runs),
+    # so the handlers don't re-check for empty queries
+    query: constr(strip_whitespace=True, min_length=1, max_length=2048)
 
 class QueryResponse(BaseModel):
     response: str
@@ -31,14 +168,36 @@ class HealthResponse(BaseModel):
 @asynccontextmanager
 async def lifespan(app):
     """Initialize agent on startup"""
-    global agent
+    global agent, _embed_queue, _embed_task
     print("[*] Initializing RAG agent...")
     try:
         agent = get_agent()
         print("[OK] Agent ready!")
+        # Warm the stack so the first real request doesn't pay for lazy
+        # kernel selection, HNSW page-in, or Ollama loading the model
+        try:
+            agent.embeddings.embed_query("warmup")
+            agent.retriever.invoke("warmup")
+            agent.llm.invoke("hi")
+            print("[OK] Warm-up complete")
+            if os.environ.get("RAG_WARMUP") == "1":
+                # Optional full pipeline pass (classify + retrieve +
+                # generate) so even the graph path is hot; costs one
+                # complete generation, hence opt-in
+                await asyncio.get_event_loop().run_in_executor(
+                    None, agent.query, "warmup: ignore"
+                )
+                print("[OK] Full pipeline warm-up complete")
+        except Exception as e:
+            print(f"[WARN] Warm-up failed: {e}")
     except Exception as e:
         print(f"[ERROR] Failed to initialize agent: {e}")
+    if agent is not None:
+        _embed_queue = asyncio.Queue()
+        _embed_task = asyncio.create_task(_embed_batcher())
     yield
+    if _embed_task is not None:
+        _embed_task.cancel()
     print("[*] Shutting down...")
 
 # Create a router instead of an app
@@ -48,10 +207,7 @@ router = APIRouter()
 async def troubleshoot(request: QueryRequest):
     """Process a troubleshooting query"""
     global agent
-    
-    if not request.query:
-        raise HTTPException(status_code=400, detail="Query is required")
-    
+
     if agent is None:
         # Try to initialize again or fail
         msg = "Agent not initialized"
@@ -59,12 +215,91 @@ async def troubleshoot(request: QueryRequest):
         raise HTTPException(status_code=503, detail=msg)
     
     try:
-        print(f"[Query] {request.query}")
-        response = agent.query(request.query)
-        print(f"[Response] {response[:100]}...")
+        log.info("[Query] %s", request.query)
+
+        normalized = request.query.strip().lower()
+        q_vec = None
+        try:
+            cached, q_vec = await _sem_lookup(normalized)
+            if cached is not None:
+                log.info("[Cache] Semantic cache hit")
+                return QueryResponse(response=cached)
+        except Exception as e:
+            log.warning("Semantic cache lookup failed: %s", e)
+
+        async with GEN_SEM:
+            response = await agent.aquery(request.query)
+        log.info("[Response] %.100s...", response)
+
+        if q_vec is not None:
+            await _sem_store(normalized, q_vec, response)
+
         return QueryResponse(response=response)
     except Exception as e:
-        print(f"[Error] {str(e)}")
+        log.error("Troubleshoot failed: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/api/troubleshoot/stream")
+async def troubleshoot_stream(request: QueryRequest):
+    """Stream the response as server-sent events, token by token"""
+    if agent is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+
+    async def event_stream():
+        try:
+            async with GEN_SEM:
+                async for chunk in agent.astream_query(request.query):
+                    yield f"data: {chunk}\n\n"
+            yield "data: [DONE]\n\n"
+        except Exception as e:
+            log.error("Stream failed: %s", e)
+            yield f"data: [ERROR] {str(e)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@router.post("/api/admin/rebuild")
+async def admin_rebuild():
+    """Rebuild the vector database in-process, reusing the loaded model"""
+    if agent is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+
+    try:
+        from .rebuild_vectordb import rebuild_database
+    except ImportError:
+        from rebuild_vectordb import rebuild_database
+
+    new_dir = VECTORDB_DIR + ".new"
+    old_dir = VECTORDB_DIR + ".old"
+
+    def _rebuild_and_swap():
+        # Build into a fresh dir with the agent's already-loaded
+        # embedding model (skips the 30-60s standalone model load)
+        rebuild_database(embeddings=agent.embeddings, target_dir=new_dir)
+        # Swap first, invalidate after: dropping the cached properties
+        # before the rename would let a concurrent query re-materialize
+        # a Chroma handle against the old directory just as it vanishes
+        if os.path.exists(VECTORDB_DIR):
+            os.rename(VECTORDB_DIR, old_dir)
+        os.rename(new_dir, VECTORDB_DIR)
+        agent.__dict__.pop("retriever", None)
+        agent.__dict__.pop("vectorstore", None)
+        # Both agent caches hold answers derived from the old corpus
+        agent._retrieval_cache.clear()
+        agent._response_cache.clear()
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    global _sem_embs, _sem_count
+    try:
+        await asyncio.to_thread(_rebuild_and_swap)
+        # The semantic cache also stores old-corpus responses
+        async with _sem_lock:
+            _sem_index.clear()
+            _sem_responses.clear()
+            _sem_embs = None
+            _sem_count = 0
+        return {"status": "success", "message": "Vector database rebuilt"}
+    except Exception as e:
+        log.error("Rebuild failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/api/health", response_model=HealthResponse)
@@ -6,33 +6,56 @@ import os
 import shutil
 from pathlib import Path
 
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import TextLoader, PyPDFLoader
 
+try:
+    from .embeddings import EMBEDDING_MODEL, get_embeddings
+except ImportError:
+    from embeddings import EMBEDDING_MODEL, get_embeddings
+
 SCRIPT_DIR = Path(__file__).parent
 DATA_DIR = SCRIPT_DIR / "data"
 VECTORDB_DIR = SCRIPT_DIR / "vectordb"
-EMBEDDING_MODEL = "BAAI/bge-base-en-v1.5"
 
-def rebuild_database():
+def _detect_device():
+    """Use CUDA for the one-shot rebuild when available."""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return 'cuda'
+    except ImportError:
+        pass
+    return 'cpu'
+
+def rebuild_database(embeddings=None, target_dir=None):
+    """Rebuild the vector database.
+
+    Pass an existing `embeddings` instance (e.g. the running agent's)
+    to skip the 30-60s model load, and a `target_dir` to build into a
+    fresh directory for an atomic swap instead of rebuilding in place.
+    """
+    target_dir = Path(target_dir) if target_dir else VECTORDB_DIR
+
     print("="*60)
     print("REBUILDING VECTOR DATABASE")
     print("="*60)
-    
+
     # Remove existing vector database
-    if VECTORDB_DIR.exists():
+    if target_dir.exists():
         print(f"\n🗑️  Removing existing vector database...")
-        shutil.rmtree(VECTORDB_DIR)
-    
-    # Load embeddings
-    print(f"\n📦 Loading embedding model: {EMBEDDING_MODEL}")
-    embeddings = HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL,
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
-    )
+        shutil.rmtree(target_dir)
+
+    if embeddings is None:
+        # Load embeddings - large encode batches amortize tokenizer and
+        # dispatch overhead across the whole corpus
+        device = _detect_device()
+        batch_size = int(os.environ.get("BGE_EMBED_BATCH_SIZE", 128 if device == 'cuda' else 32))
+        print(f"\n📦 Loading embedding model: {EMBEDDING_MODEL} (device={device}, batch_size={batch_size})")
+        # Shared singleton: reuses the agent's already-loaded model when
+        # the rebuild runs inside the server process
+        embeddings = get_embeddings(device=device, batch_size=batch_size)
     
     # Load documents
     print(f"\n📄 Loading documents from: {DATA_DIR}")
@@ -65,6 +88,10 @@ def rebuild_database():
     
     chunks = text_splitter.split_documents(documents)
     print(f"   Total chunks created: {len(chunks)}")
+
+    # Sort by length so each encode batch holds similar-sized chunks
+    # and wastes less compute on padding (smart batching)
+    chunks.sort(key=lambda chunk: len(chunk.page_content))
     
     # Show sample chunks
     print(f"\n📋 Sample chunks:")
@@ -77,10 +104,17 @@ def rebuild_database():
     vectorstore = Chroma.from_documents(
         documents=chunks,
         embedding=embeddings,
-        persist_directory=str(VECTORDB_DIR)
+        persist_directory=str(target_dir),
+        # Build a denser HNSW graph up front (one-time cost here) so
+        # query-time search can run with a small ef and still hit recall
+        collection_metadata={
+            "hnsw:space": "cosine",
+            "hnsw:construction_ef": 200,
+            "hnsw:M": 32
+        }
     )
     
-    print(f"\n✅ Vector database created at: {VECTORDB_DIR}")
+    print(f"\n✅ Vector database created at: {target_dir}")
     print(f"   Total vectors: {vectorstore._collection.count()}")
     
     # Test retrieval
@@ -0,0 +1,85 @@
+"""Latency benchmark for the troubleshooting API.
+
+Drives N requests concurrently with httpx.AsyncClient + asyncio.gather
+so the measured wall time reflects server throughput and tail latency
+instead of N serialized round trips.
+
+    python test_latency.py --n 10 --query "Camera is not detecting defects"
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+BASE_URL = "http://localhost:5001"
+ENDPOINT = "/api/troubleshoot"
+DEFAULT_QUERY = "Camera is not detecting defects properly"
+
+
+async def timed_post(client, payload):
+    """POST once and return (latency_ms, ok)."""
+    start = time.perf_counter_ns()
+    try:
+        response = await client.post(ENDPOINT, json=payload)
+        ok = response.status_code == 200
+        if not ok:
+            print(f"   HTTP {response.status_code}: {response.text[:80]}")
+    except Exception as e:
+        print(f"   Request failed: {e}")
+        ok = False
+    return (time.perf_counter_ns() - start) / 1e6, ok
+
+
+async def test_endpoint(n, query):
+    payload = {"query": query}
+
+    # One client so every request shares the same keep-alive pool; size
+    # it to the request count so nothing queues on connection churn
+    limits = httpx.Limits(max_connections=max(n, 32), max_keepalive_connections=max(n, 32))
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=120.0, limits=limits) as client:
+        # Throwaway warmup: pays the first TCP handshake and server-side
+        # lazy init outside the timed window
+        try:
+            await client.get("/api/health")
+        except Exception as e:
+            print(f"   Warmup request failed: {e}")
+
+        wall_start = time.perf_counter_ns()
+        results = await asyncio.gather(
+            *[timed_post(client, payload) for _ in range(n)]
+        )
+        wall_ms = (time.perf_counter_ns() - wall_start) / 1e6
+
+    latencies = [ms for ms, ok in results if ok]
+    failures = n - len(latencies)
+
+    print("\n" + "=" * 60)
+    print(f"Requests:  {n} concurrent ({failures} failed)")
+    print(f"Wall time: {wall_ms:.1f} ms")
+    if latencies:
+        print(f"Mean:      {statistics.mean(latencies):.1f} ms")
+        print(f"Min/Max:   {min(latencies):.1f} / {max(latencies):.1f} ms")
+        if len(latencies) >= 2:
+            # Mean/min/max hide the tail, which is what users feel
+            quantiles = statistics.quantiles(latencies, n=100)
+            print(f"p50:       {quantiles[49]:.1f} ms")
+            print(f"p95:       {quantiles[94]:.1f} ms")
+            print(f"p99:       {quantiles[98]:.1f} ms")
+    print("=" * 60)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Troubleshooting API latency benchmark")
+    parser.add_argument("--n", type=int, default=10, help="number of concurrent requests")
+    parser.add_argument("--query", default=DEFAULT_QUERY)
+    args = parser.parse_args()
+
+    print(f"Benchmarking {BASE_URL}{ENDPOINT} with {args.n} concurrent requests...")
+    await test_endpoint(args.n, args.query)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())